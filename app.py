@@ -1,125 +1,424 @@
-from flask import Flask, request, redirect, url_for, render_template
+from flask import Flask, Response, request, redirect, url_for, render_template
+import contextlib
+import csv
+import functools
+import hashlib
+import html
+import io
+import multiprocessing
 import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import pandas as pd
-import re  # Import the regular expression module for parsing descriptions
+from pyarrow import csv as pacsv
+from pyarrow import feather
+import pyarrow as pa
+import pyarrow.compute as pc
 from werkzeug.utils import secure_filename
 
 app = Flask(__name__)
 
-# Set the folder to store uploaded files
+# Set the folder to store parsed upload caches
 UPLOAD_FOLDER = 'uploads/'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)  # Create folder if it doesn't exist (also when run under a WSGI server)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # Limit file size to 16MB
 
+# Parsed uploads are cached as Feather files in the upload folder. Bump the version whenever the parsed table
+# changes (CSV options, columns, types) so stale entries are never loaded; the least recently used files are
+# deleted once the cache grows past the size cap.
+PARSE_CACHE_VERSION = 1
+PARSE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Temporary cache files older than this were left by a worker that died mid-write and are deleted on eviction
+PARSE_CACHE_TMP_MAX_AGE_SECONDS = 600
+
+# Columns used for analysis and display; everything else in the report is dropped after parsing
+TRADE_COLUMNS = ['Settle Date', 'Instrument', 'Trans Code', 'Quantity', 'Price', 'Amount', 'Description']
+
+# Worker processes that run the analysis off the request thread. Workers are spawned rather than forked
+# because the web server is multi-threaded; a pool broken by a crashed worker is replaced on the next use.
+def new_executor():
+    return ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=multiprocessing.get_context('spawn'))
+
+executor = new_executor()
+executor_lock = threading.Lock()
+
+# Pending jobs keyed by token; jobs whose status page is never fetched are dropped after the TTL
+JOB_TTL_SECONDS = 10 * 60
+jobs = {}
+
+# Analysis futures of recent uploads keyed by content hash, so re-uploading the same report skips the analysis
+# Only successful results are kept, within both an entry and a byte budget (results include the trade data)
+ANALYSIS_CACHE_SIZE = 128
+ANALYSIS_CACHE_MAX_BYTES = 64 * 1024 * 1024
+analysis_cache = OrderedDict()  # digest -> (future, result size in bytes once finished)
+analysis_cache_lock = threading.Lock()
+
 # Allowed file extensions (only .csv for now)
 ALLOWED_EXTENSIONS = {'csv'}
 
+# Regex patterns, passed as plain strings because Arrow's string kernels compile them natively
+# Option description format: "PLTR 01/19/24 C 25"
+OPTION_PATTERN = r'(?P<ticker>\w+)\s+(?P<expiration>\d{2}/\d{2}/\d{2})\s+(?P<option_type>[PC])\s+(?P<strike>\d+)'
+CURRENCY_PATTERN = r'[\$,]'
+AMOUNT_PATTERN = r'[\$,()]'
+
+# CSV parse options: quoted descriptions span several lines, bad lines are skipped
+CSV_PARSE_OPTIONS = pacsv.ParseOptions(newlines_in_values=True, invalid_row_handler=lambda row: 'skip')
+# Trade columns are read as strings and converted during analysis, so types inferred from the first batch
+# can never conflict with a later one; empty cells are nulls. The heavily repeated text columns are
+# dictionary-encoded while parsing so each distinct ticker, code or contract is stored once.
+DICTIONARY_COLUMNS = ['Instrument', 'Trans Code', 'Description']
+CSV_COLUMN_TYPES = {
+    col: pa.dictionary(pa.int32(), pa.string()) if col in DICTIONARY_COLUMNS else pa.string()
+    for col in TRADE_COLUMNS
+}
+
 # Function to check if the file extension is allowed
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def extract_option_details(description):
+# Arrow dictionary columns become pandas categoricals; everything else stays Arrow-backed
+def pandas_dtype(arrow_type):
+    return None if pa.types.is_dictionary(arrow_type) else pd.ArrowDtype(arrow_type)
+
+def read_trade_table(file_bytes):
+    """
+    Stream a trade report CSV in record batches, converting only the trade columns named in its header.
+    Other columns are skipped by the reader, so their contents can never fail the parse, and the
+    full-width report is never held in memory at once.
+    """
+    header_line = file_bytes.split(b'\n', 1)[0].decode('utf-8-sig', errors='replace')
+    header = next(csv.reader([header_line]), [])
+    columns = list(dict.fromkeys(name for name in header if name in TRADE_COLUMNS))
+    if not columns:
+        # An empty include list means "every column" to Arrow; no trade columns means nothing to read
+        return pa.table({})
+    convert_options = pacsv.ConvertOptions(
+        include_columns=columns,
+        column_types=CSV_COLUMN_TYPES,
+        strings_can_be_null=True,
+    )
+    reader = pacsv.open_csv(pa.BufferReader(file_bytes), parse_options=CSV_PARSE_OPTIONS, convert_options=convert_options)
+    return pa.Table.from_batches(reader, schema=reader.schema)
+
+# Hash of the file contents used as the cache key, so renamed copies of a report share cache entries
+def upload_digest(file_bytes):
+    return hashlib.blake2b(file_bytes, digest_size=16).hexdigest()
+
+def evict_parse_cache():
+    """
+    Delete stale temporary cache files, then the least recently used Feather cache files until the cache
+    fits in PARSE_CACHE_MAX_BYTES.
+    """
+    entries = []
+    stale_before = time.time() - PARSE_CACHE_TMP_MAX_AGE_SECONDS
+    for entry in os.scandir(app.config['UPLOAD_FOLDER']):
+        with contextlib.suppress(FileNotFoundError):
+            if entry.name.endswith('.arrow'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+            elif entry.name.endswith('.tmp') and entry.stat().st_mtime < stale_before:
+                os.remove(entry.path)
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= PARSE_CACHE_MAX_BYTES:
+            break
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+        total -= size
+
+def write_parse_cache(table, cache_path):
+    """
+    Store a parsed table as a Feather cache file. Caching is best effort: a failed write only logs a warning.
+    """
+    # Write to a temporary file first so a concurrent request never reads a partial cache entry
+    fd, tmp_path = tempfile.mkstemp(dir=app.config['UPLOAD_FOLDER'], suffix='.tmp')
+    os.close(fd)
+    try:
+        feather.write_feather(table, tmp_path, compression='zstd')
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        app.logger.warning('Could not write parse cache %s', cache_path, exc_info=True)
+        return
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+    evict_parse_cache()
+
+def read_trade_csv_cached(file_bytes, digest):
     """
-    Extract the option details (ticker, expiration, type, strike price) from the description column.
-    Example description format: "PLTR 01/19/24 C 25"
+    Parse an uploaded trade report, reusing the Feather copy of the parsed table when the same file was uploaded before.
     """
-    match = re.search(r'(\w+)\s+(\d{2}/\d{2}/\d{2})\s+([PC])\s+(\d+)', description)
-    if match:
-        ticker, expiration, option_type, strike = match.groups()
-        return ticker, expiration, option_type, strike
-    return None, None, None, None
+    cache_path = os.path.join(app.config['UPLOAD_FOLDER'], f'{digest}.v{PARSE_CACHE_VERSION}.arrow')
+    try:
+        table = feather.read_table(cache_path)
+    except FileNotFoundError:
+        table = None
+
+    if table is None:
+        table = read_trade_table(file_bytes)
+        write_parse_cache(table, cache_path)
+    else:
+        # Mark the entry as recently used so eviction removes older files first
+        with contextlib.suppress(FileNotFoundError):
+            os.utime(cache_path)
+    return table.to_pandas(types_mapper=pandas_dtype)
+
+# Replace NaN with null in a float column so aggregations skip it; other columns are returned unchanged
+def nan_to_null(column):
+    if not pa.types.is_floating(column.type):
+        return column
+    return pc.if_else(pc.is_nan(column), pa.scalar(None, column.type), column)
+
+def summarize_trades(trades, keys, buy_code, sell_code):
+    """
+    Total the buy and sell notionals per key with Arrow compute kernels and compute profit/loss and return %.
+    Keys that were bought but never sold are returned as unresolved.
+    """
+    codes = [buy_code, sell_code]
+    table = pa.Table.from_pandas(
+        trades.loc[trades['Trans Code'].isin(codes), keys + ['Trans Code', 'Quantity', 'Price']], preserve_index=False
+    )
+
+    # Skip rows with a missing key, the same way pandas' groupby drops null keys
+    table = table.filter(functools.reduce(pc.and_, [pc.is_valid(table[key]) for key in keys]))
+    # Numbers that failed to parse are NaN rather than null; Arrow's sum propagates NaN where pandas skipped it
+    quantity, price = nan_to_null(table['Quantity']), nan_to_null(table['Price'])
+    table = table.set_column(table.schema.get_field_index('Quantity'), 'Quantity', quantity)
+    table = table.append_column('Notional', pc.multiply(quantity, price))
+
+    # The built-in hash aggregation sums every group in one compiled pass, so no per-group UDF (or JIT) is needed;
+    # only the small per-key result is converted back to pandas
+    sum_options = pc.ScalarAggregateOptions(min_count=0)  # all-null groups sum to 0, as in pandas
+    grouped = table.group_by(keys + ['Trans Code']).aggregate([
+        ('Notional', 'sum', sum_options),
+        ('Quantity', 'sum', sum_options),
+        ('Price', 'count', pc.CountOptions(mode='all')),
+    ])
+    totals = (
+        grouped.to_pandas()
+        .rename(columns={'Notional_sum': 'Notional', 'Quantity_sum': 'Quantity', 'Price_count': 'Trades'})
+        .set_index(keys + ['Trans Code'])
+        .unstack(fill_value=0)
+        .reindex(columns=pd.MultiIndex.from_product([['Notional', 'Quantity', 'Trades'], codes]), fill_value=0)
+    )
+    if len(keys) > 1:
+        totals.index = totals.index.map(' '.join)
+
+    # Only keys with trades on both sides are analyzed; keys that were bought but never sold stay unresolved.
+    # Sides are decided by row count, so a $0 price or an unparseable quantity doesn't hide a ticker;
+    # such a row still counts as a trade but is left out of the sums (see nan_to_null).
+    bought = totals['Trades'][buy_code] > 0
+    sold = totals['Trades'][sell_code] > 0
+    unresolved = totals.index[bought & ~sold].tolist()
+    totals = totals[bought & sold]
+    notional, quantity = totals['Notional'], totals['Quantity']
+
+    profit_loss = notional[sell_code] - notional[buy_code]
+    return_pct = (profit_loss / notional[buy_code] * 100).where(notional[buy_code] != 0, 0)
+    performance = pd.DataFrame({
+        'Total Quantity': quantity[buy_code],
+        'Total Profit/Loss': profit_loss,
+        'Return %': return_pct,
+    }).to_dict(orient='index')
+    return performance, unresolved
 
 def analyze_performance(data):
     # Clean data: Remove $ signs and parentheses
-    data['Price'] = pd.to_numeric(data['Price'].replace('[\\$,]', '', regex=True), errors='coerce')
-    data['Quantity'] = pd.to_numeric(data['Quantity'], errors='coerce')
-    data['Amount'] = data['Amount'].replace('[\\$,]', '', regex=True)
-    data['Amount'] = data['Amount'].str.replace(r'\(([^)]+)\)', r'-\1')
-    data['Amount'] = pd.to_numeric(data['Amount'], errors='coerce')
-
-    # Separate stock and option transactions
-    stock_buy_transactions = data[data['Trans Code'].str.contains('Buy', na=False)]
-    stock_sell_transactions = data[data['Trans Code'].str.contains('Sell', na=False)]
-    option_buy_transactions = data[data['Trans Code'].str.contains('BTO', na=False)]
-    option_sell_transactions = data[data['Trans Code'].str.contains('STO', na=False)]
-    ach_transactions = data[data['Trans Code'].str.contains('ACH', na=False)]
-
-    performance = {}
-    unresolved = []
+    data['Price'] = pd.to_numeric(data['Price'].str.replace(CURRENCY_PATTERN, '', regex=True), errors='coerce')
+    # Whole-share quantities are downcast to the smallest integer type; currency stays float64 to keep cents exact
+    data['Quantity'] = pd.to_numeric(data['Quantity'], errors='coerce', downcast='integer')
+    # Amounts are cleaned in a single regex pass; negatives are written as "($210.03)"
+    negative = data['Amount'].str.startswith('(', na=False)
+    amount = pd.to_numeric(data['Amount'].str.replace(AMOUNT_PATTERN, '', regex=True), errors='coerce')
+    data['Amount'] = amount.mask(negative, -amount)
+
+    # Filters and groupbys compare the integer codes of the dictionary-encoded columns instead of strings
+    # (a no-op when the columns were already dictionary-encoded while parsing)
+    for col in DICTIONARY_COLUMNS:
+        data[col] = data[col].astype('category')
 
     # Handle stock transactions (Buy/Sell)
-    for ticker in stock_buy_transactions['Instrument'].dropna().unique():
-        total_profit_loss = 0
-        total_quantity = 0
-        buys = stock_buy_transactions[stock_buy_transactions['Instrument'] == ticker]
-        sells = stock_sell_transactions[stock_sell_transactions['Instrument'] == ticker]
-
-        if not buys.empty and not sells.empty:
-            total_bought = (buys['Quantity'] * buys['Price']).sum()
-            total_sold = (sells['Quantity'] * sells['Price']).sum()
-            profit_loss = total_sold - total_bought
-            total_quantity = buys['Quantity'].sum()
-
-            performance[ticker] = {
-                'Total Quantity': total_quantity,
-                'Total Profit/Loss': profit_loss,
-                'Return %': (profit_loss / total_bought) * 100 if total_bought != 0 else 0
-            }
-        else:
-            unresolved.append(ticker)
-
-    # Handle options transactions (BTO/STO) based on expiration and strike price
-    for _, row in option_buy_transactions.iterrows():
-        ticker, expiration, option_type, strike = extract_option_details(row['Description'])
-        if ticker:
-            # Find corresponding STO (sell to open)
-            matching_sell = option_sell_transactions[
-                (option_sell_transactions['Description'].str.contains(expiration)) &
-                (option_sell_transactions['Instrument'] == ticker)
-            ]
-
-            if not matching_sell.empty:
-                total_bought = row['Quantity'] * row['Price']
-                total_sold = (matching_sell['Quantity'] * matching_sell['Price']).sum()
-                profit_loss = total_sold - total_bought
-                total_quantity = row['Quantity']
-
-                key = f"{ticker} {expiration} {option_type} {strike}"
-                performance[key] = {
-                    'Total Quantity': total_quantity,
-                    'Total Profit/Loss': profit_loss,
-                    'Return %': (profit_loss / total_bought) * 100 if total_bought != 0 else 0
-                }
-            else:
-                unresolved.append(f"{ticker} {expiration} {option_type} {strike}")
+    performance, unresolved = summarize_trades(data, ['Instrument'], 'Buy', 'Sell')
+
+    # Extract the option details (ticker, expiration, type, strike price) once per distinct option description
+    # and expand them to the option rows through the dictionary codes
+    option_trades = data[data['Trans Code'].isin(['BTO', 'STO'])]
+    descriptions = option_trades['Description'].cat.remove_unused_categories()
+    contracts = pd.Series(descriptions.cat.categories, dtype=pd.ArrowDtype(pa.string())).str.extract(OPTION_PATTERN)
+    option_details = contracts.reindex(descriptions.cat.codes).set_axis(option_trades.index)
+    option_trades = pd.concat([option_trades, option_details], axis=1)
+
+    # Handle options transactions (BTO/STO): opens and closes of the same contract are paired by the groupby key
+    option_performance, option_unresolved = summarize_trades(
+        option_trades, ['ticker', 'expiration', 'option_type', 'strike'], 'BTO', 'STO'
+    )
+    performance.update(option_performance)
+    unresolved.extend(option_unresolved)
 
     return performance, unresolved
 
 def generate_summary(performance, unresolved):
-    summary = "<h2>Portfolio Performance Summary</h2><ul>"
+    # Collect HTML fragments in a list and join once instead of repeatedly concatenating strings
+    parts = ["<h2>Portfolio Performance Summary</h2><ul>"]
 
     total_profit = 0
     for ticker, data in performance.items():
         total_profit += data['Total Profit/Loss']
-        summary += f"<li><strong>{ticker}</strong>: {data['Total Quantity']} shares/contracts, Profit/Loss: ${data['Total Profit/Loss']:.2f}, Return: {data['Return %']:.2f}%</li>"
+        parts.append(f"<li><strong>{ticker}</strong>: {data['Total Quantity']} shares/contracts, Profit/Loss: ${data['Total Profit/Loss']:.2f}, Return: {data['Return %']:.2f}%</li>")
 
-    summary += f"<li><strong>Total Portfolio Profit/Loss</strong>: ${total_profit:.2f}</li></ul>"
+    parts.append(f"<li><strong>Total Portfolio Profit/Loss</strong>: ${total_profit:.2f}</li></ul>")
 
     if unresolved:
-        summary += "<h3>Unresolved Trades</h3><ul>"
-        for unresolved_trade in unresolved:
-            summary += f"<li>{unresolved_trade}</li>"
-        summary += "</ul>"
+        parts.append("<h3>Unresolved Trades</h3><ul>")
+        parts.extend(f"<li>{unresolved_trade}</li>" for unresolved_trade in unresolved)
+        parts.append("</ul>")
 
     # Write-up based on performance
-    write_up = f"<h3>Overall Insights</h3><p>The total portfolio performance shows a net {'profit' if total_profit > 0 else 'loss'} of ${total_profit:.2f}. "
+    parts.append(f"<h3>Overall Insights</h3><p>The total portfolio performance shows a net {'profit' if total_profit > 0 else 'loss'} of ${total_profit:.2f}. ")
 
     if total_profit > 0:
-        write_up += "The strategy appears to be profitable with significant gains from well-timed buys and sells."
+        parts.append("The strategy appears to be profitable with significant gains from well-timed buys and sells.")
     else:
-        write_up += "The portfolio has experienced losses, which may be attributed to some underperforming trades or option expirations."
+        parts.append("The portfolio has experienced losses, which may be attributed to some underperforming trades or option expirations.")
 
-    return summary + write_up
+    return ''.join(parts)
+
+def analyze_upload(file_bytes, digest):
+    """
+    Parse and analyze an uploaded trade report in a worker process.
+    Returns the summary HTML and the cleaned trade data, or None if the required columns are missing.
+    """
+    # Parse the CSV file with pyarrow (or load the cached parse), skip bad lines
+    data = read_trade_csv_cached(file_bytes, digest)
+    if not all(col in data.columns for col in TRADE_COLUMNS):
+        return None
+
+    # Extract key columns right away so every later pass touches only those
+    extracted_data = data[TRADE_COLUMNS].copy()
+
+    # Analyze performance and generate summary
+    performance, unresolved = analyze_performance(extracted_data)
+    return generate_summary(performance, unresolved), extracted_data
+
+# Fixed formats for float columns in the trade table: amounts to the cent, quantities to six decimals
+CELL_FORMATS = {'Quantity': '{:.6f}', 'Amount': '{:.2f}'}
+# Prices get as many decimals as the most precise price needs, so sub-dollar fills keep their digits
+PRICE_DECIMALS = range(2, 7)
+
+# Format for the Price column: the fewest decimals (at least cents, at most six) that show every price exactly
+def price_format(prices):
+    prices = prices.dropna().astype('float64')
+    for decimals in PRICE_DECIMALS:
+        if ((prices - prices.round(decimals)).abs() < 1e-9).all():
+            break
+    return f'{{:.{decimals}f}}'
+
+# Format a single table cell, escaping HTML and showing missing values as NaN
+def format_cell(value, cell_format='{}'):
+    return 'NaN' if pd.isna(value) else html.escape(cell_format.format(value))
+
+def iter_table_html(data, chunksize=1000):
+    """
+    Yield the trade table as HTML in chunks of rows so the response can be streamed while it renders.
+    Much faster than DataFrame.to_html, which formats every cell through pandas' Python formatters.
+    """
+    yield '<table border="1" class="dataframe">\n<thead><tr>'
+    yield ''.join(f'<th>{html.escape(str(column))}</th>' for column in data.columns)
+    yield '</tr></thead>\n<tbody>\n'
+    # Every value of a float column gets the same format (integer columns, e.g. whole-share quantities, don't)
+    cell_formats = [
+        '{}' if not pd.api.types.is_float_dtype(data[column])
+        else price_format(data[column]) if column == 'Price'
+        else CELL_FORMATS.get(column, '{}')
+        for column in data.columns
+    ]
+    for start in range(0, len(data), chunksize):
+        buf = io.StringIO()
+        for row in data.iloc[start:start + chunksize].itertuples(index=False, name=None):
+            buf.write('<tr>' + ''.join(
+                f'<td>{format_cell(value, cell_format)}</td>' for value, cell_format in zip(row, cell_formats)
+            ) + '</tr>\n')
+        yield buf.getvalue()
+    yield '</tbody>\n</table>'
+
+def restart_executor_if_broken():
+    """
+    Replace the worker pool if a crashed worker has broken it.
+    """
+    global executor
+    with executor_lock:
+        try:
+            executor.submit(int).cancel()
+        except BrokenProcessPool:
+            executor.shutdown(wait=False)
+            executor = new_executor()
+
+def submit_job(fn, *args):
+    """
+    Submit work to the worker pool, replacing the pool once if it is broken.
+    """
+    try:
+        return executor.submit(fn, *args)
+    except BrokenProcessPool:
+        restart_executor_if_broken()
+        return executor.submit(fn, *args)
+
+# Drop jobs older than the TTL, e.g. when the user closed the tab before the results were shown
+def prune_jobs():
+    expired = time.monotonic() - JOB_TTL_SECONDS
+    for token, (_, _, submitted_at) in list(jobs.items()):
+        if submitted_at < expired:
+            jobs.pop(token, None)
+
+# Approximate in-memory size of an analysis result, used for the analysis cache's byte budget
+def result_size(result):
+    if result is None:
+        return 0
+    summary_html, extracted_data = result
+    return len(summary_html) + int(extracted_data.memory_usage(deep=True).sum())
+
+def cache_analysis_result(digest, future):
+    """
+    Done callback for cached analysis futures: drop failed jobs so a re-upload retries them,
+    and evict the least recently used results while the cache is over its byte budget.
+    """
+    with analysis_cache_lock:
+        entry = analysis_cache.get(digest)
+        if entry is None or entry[0] is not future:
+            return
+        if future.cancelled() or future.exception() is not None:
+            del analysis_cache[digest]
+            return
+        analysis_cache[digest] = (future, result_size(future.result()))
+        total = sum(size for _, size in analysis_cache.values())
+        while total > ANALYSIS_CACHE_MAX_BYTES:
+            _, (_, size) = analysis_cache.popitem(last=False)
+            total -= size
+
+def submit_analysis(file_bytes):
+    """
+    Return the analysis future for an upload, reusing the one from an earlier upload of the same file.
+    """
+    digest = upload_digest(file_bytes)
+    with analysis_cache_lock:
+        entry = analysis_cache.get(digest)
+        if entry is not None:
+            analysis_cache.move_to_end(digest)
+            return entry[0]
+        future = submit_job(analyze_upload, file_bytes, digest)
+        analysis_cache[digest] = (future, 0)
+        if len(analysis_cache) > ANALYSIS_CACHE_SIZE:
+            analysis_cache.popitem(last=False)
+    # Registered outside the lock: the callback runs immediately if the job has already finished
+    future.add_done_callback(functools.partial(cache_analysis_result, digest))
+    return future
 
 @app.route('/', methods=['GET', 'POST'])
 def upload_file():
@@ -131,34 +430,16 @@ def upload_file():
         # If the user does not select a file
         if file.filename == '':
             return 'No selected file'
-        # If the file is allowed, save it to the upload folder
+        # If the file is allowed, parse it straight from the upload stream
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
+            file_bytes = file.stream.read()
 
-            try:
-                # Parse the CSV file with pandas, skip bad lines
-                data = pd.read_csv(file_path, on_bad_lines='skip')
-
-                # Extract key columns for display
-                if all(col in data.columns for col in ['Settle Date', 'Instrument', 'Trans Code', 'Quantity', 'Price', 'Amount', 'Description']):
-                    # Analyze performance
-                    performance, unresolved = analyze_performance(data)
-
-                    # Generate summary
-                    summary_html = generate_summary(performance, unresolved)
-
-                    # Extract relevant columns and display
-                    extracted_data = data[['Settle Date', 'Instrument', 'Trans Code', 'Quantity', 'Price', 'Amount', 'Description']]
-                    extracted_data_html = extracted_data.to_html(index=False)  # Convert to HTML without the index column
-
-                    # Displaying the summary, unresolved, and extracted data in the web app
-                    return f'<h1>File {filename} uploaded successfully!</h1>{summary_html}<h2>Trade Data:</h2>{extracted_data_html}'
-                else:
-                    return 'Error: Required columns not found in the file.'
-            except pd.errors.ParserError:
-                return 'There was an error parsing the CSV file. Please check the format and try again.'
+            # Hand the analysis to the worker pool and let the browser poll for the result
+            prune_jobs()
+            token = uuid.uuid4().hex
+            jobs[token] = (filename, submit_analysis(file_bytes), time.monotonic())
+            return redirect(url_for('job_status', token=token))
 
         else:
             return 'Invalid file format. Please upload a CSV file.'
@@ -172,7 +453,43 @@ def upload_file():
         </form>
     '''
 
+@app.route('/status/<token>')
+def job_status(token):
+    job = jobs.get(token)
+    if job is None:
+        return 'Unknown or expired analysis job.'
+    filename, future, _ = job
+    if not future.done():
+        # Refresh every second until the worker finishes
+        return f'''
+            <meta http-equiv="refresh" content="1">
+            <h1>Analyzing {filename}...</h1>
+        '''
+    jobs.pop(token, None)
+
+    try:
+        result = future.result()
+    except pa.ArrowInvalid:
+        return 'There was an error parsing the CSV file. Please check the format and try again.'
+    except BrokenProcessPool:
+        restart_executor_if_broken()
+        return 'The analysis worker stopped unexpectedly. Please upload the file again.'
+    except Exception:
+        app.logger.exception('Analysis of %s failed', filename)
+        return 'There was an error analyzing the CSV file. Please check the format and try again.'
+    if result is None:
+        return 'Error: Required columns not found in the file.'
+    summary_html, extracted_data = result
+
+    # Stream the summary first, then the cleaned trade data as it renders
+    def generate():
+        yield f'<h1>File {filename} uploaded successfully!</h1>'
+        yield summary_html
+        yield '<h2>Trade Data:</h2>'
+        yield from iter_table_html(extracted_data)
+
+    return Response(generate(), mimetype='text/html')
+
 if __name__ == '__main__':
-    if not os.path.exists(UPLOAD_FOLDER):
-        os.makedirs(UPLOAD_FOLDER)  # Create folder if it doesn't exist
-    app.run(debug=True, host='0.0.0.0', port=5001)
+    # Development server only; in production run under gunicorn (see README)
+    app.run(debug=os.environ.get('FLASK_ENV') == 'dev', host='0.0.0.0', port=5001)